@@ -1,12 +1,31 @@
 import requests
 import logging
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config.config import COINGECKO_API_KEY
-from app.logger import setup_logger
 
-# Setup logger
+# Logger
 logger = logging.getLogger("gold_silver_etl")
-logger.addHandler(setup_logger(logfile="logs/errors.log"))
+
+def create_session(session: requests.Session | None = None) -> requests.Session:
+    """
+    Creates an HTTP session that reuses connections and retries transient errors.
+
+    Args:
+        session (requests.Session | None): Existing session to configure (e.g. a cached
+            session), or None to create a plain one.
+
+    Returns:
+        requests.Session: Session with a pooled, retrying adapter mounted for HTTPS.
+    """
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry)
+    session = session or requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+_session = create_session()
 
 def fetch_metal_prices() -> dict | None:
     """
@@ -24,9 +43,9 @@ def fetch_metal_prices() -> dict | None:
     }
 
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = _session.get(url, params=params, timeout=10)
         if response.status_code != 200:
-            logger.error(f"API call failed with status code {response.status_code}")
+            logger.error("API call failed with status code %s", response.status_code)
             return None
 
         data = response.json()
@@ -39,16 +58,16 @@ def fetch_metal_prices() -> dict | None:
 
         # Add a timestamp for when the data was fetched
         result = {
-            "pax-gold": data["pax-gold"]["usd"],
-            "silver-token-xagx": data["silver-token-xagx"]["usd"],
+            "pax-gold": float(data["pax-gold"]["usd"]),
+            "silver-token-xagx": float(data["silver-token-xagx"]["usd"]),
             "timestamp": datetime.now().isoformat()
         }
         logger.info("Prices successfully fetched from CoinGecko")
         return result
 
     except requests.exceptions.RequestException as e:
-        logger.error(f"Network error during API call: {str(e)}")
+        logger.error("Network error during API call: %s", e)
         return None
-    except ValueError as e:
-        logger.error(f"Error parsing API response: {str(e)}")
+    except (ValueError, TypeError) as e:
+        logger.error("Error parsing API response: %s", e)
         return None
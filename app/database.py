@@ -3,12 +3,20 @@
 import sqlite3
 import logging
 from datetime import datetime
-from app.logger import setup_logger
-from config.config import DATABASE_PATH, ERROR_LOG
+from config.config import DATABASE_PATH
 
-# Setup logger
+# Logger
 logger = logging.getLogger("gold_silver_etl.database")
-logger.addHandler(setup_logger(logfile=ERROR_LOG))
+
+_INSERT_PRICES_SQL = """
+    INSERT INTO PreciousMetals (date, metal, price_usd, price_change)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(date, metal) DO NOTHING
+"""
+_UPDATE_CHANGES_SQL = """
+    UPDATE PreciousMetals SET price_change = ?
+    WHERE date = ? AND metal = ?
+"""
 
 def create_connection() -> sqlite3.Connection | None:
     """
@@ -19,6 +27,13 @@ def create_connection() -> sqlite3.Connection | None:
     """
     try:
         conn = sqlite3.connect(DATABASE_PATH)
+        # WAL lets readers run alongside the writer and, with synchronous=NORMAL,
+        # avoids an fsync per commit. An in-memory database has no journal file.
+        if DATABASE_PATH != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
         cursor = conn.cursor()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS PreciousMetals (
@@ -29,43 +44,166 @@ def create_connection() -> sqlite3.Connection | None:
                 UNIQUE(date, metal)
             )
         """)
+        # Lets get_latest_price descend the index instead of scanning the table
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_metal_date
+            ON PreciousMetals (metal, date DESC)
+        """)
         conn.commit()
         logger.info("Database connection created and table verified.")
         return conn
     except sqlite3.Error as e:
-        logger.error(f"Database error during connection: {str(e)}")
+        logger.error("Database error during connection: %s", e)
         return None
 
-def get_latest_price(conn: sqlite3.Connection, metal: str) -> tuple[float, str] | None:
+def close_connection(conn: sqlite3.Connection) -> None:
+    """
+    Runs PRAGMA optimize and closes the database connection.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+    """
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error as e:
+        logger.error("Database error during optimize: %s", e)
+    finally:
+        conn.close()
+
+def get_latest_price(conn: sqlite3.Connection, metal: str,
+                     before: str | None = None) -> tuple[float, str] | None:
     """
     Fetches the latest price and date for a given metal from the database.
 
     Args:
         conn (sqlite3.Connection): Database connection.
         metal (str): Metal name (e.g., "gold" or "silver").
+        before (str | None): Only consider rows dated strictly before this ISO date.
 
     Returns:
         tuple[float, str]: (latest price_usd, latest date) or None if no data or error.
     """
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT price_usd, date FROM PreciousMetals
-            WHERE metal = ? ORDER BY date DESC LIMIT 1
-        """, (metal,))
+        if before is None:
+            cursor.execute("""
+                SELECT price_usd, date FROM PreciousMetals
+                WHERE metal = ? ORDER BY date DESC LIMIT 1
+            """, (metal,))
+        else:
+            cursor.execute("""
+                SELECT price_usd, date FROM PreciousMetals
+                WHERE metal = ? AND date < ? ORDER BY date DESC LIMIT 1
+            """, (metal, before))
         result = cursor.fetchone()
         if result:
             return result
-        logger.info(f"No previous data for {metal}.")
+        logger.info("No previous data for %s.", metal)
         return None
     except sqlite3.Error as e:
-        logger.error(f"Database error fetching latest price for {metal}: {str(e)}")
+        logger.error("Database error fetching latest price for %s: %s", metal, e)
+        return None
+
+def get_next_price(conn: sqlite3.Connection, metal: str,
+                   since: str) -> tuple[float, str, float | None] | None:
+    """
+    Fetches the earliest stored row for a given metal dated on or after a date.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        metal (str): Metal name (e.g., "gold" or "silver").
+        since (str): Inclusive ISO lower bound.
+
+    Returns:
+        tuple[float, str, float | None]: (price_usd, date, price_change) or None if no data or error.
+    """
+    try:
+        cursor = conn.execute("""
+            SELECT price_usd, date, price_change FROM PreciousMetals
+            WHERE metal = ? AND date >= ? ORDER BY date LIMIT 1
+        """, (metal, since))
+        return cursor.fetchone()
+    except sqlite3.Error as e:
+        logger.error("Database error fetching next price for %s: %s", metal, e)
+        return None
+
+def get_stored_days(conn: sqlite3.Connection, start: str,
+                    end: str) -> dict[tuple[str, str], tuple[str, float, float | None, float]] | None:
+    """
+    Fetches the stored rows in [start, end) grouped by calendar day, so live ETL rows count too.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        start (str): Inclusive ISO lower bound.
+        end (str): Exclusive ISO upper bound.
+
+    Returns:
+        dict: (day, metal) -> (first row's date, first price, first change, last price),
+            or None on error.
+    """
+    try:
+        cursor = conn.execute("""
+            SELECT date, metal, price_usd, price_change FROM PreciousMetals
+            WHERE date >= ? AND date < ? ORDER BY date
+        """, (start, end))
+        stored = {}
+        for date, metal, price_usd, price_change in cursor:
+            first = stored.get((date[:10], metal))
+            if first:
+                stored[(date[:10], metal)] = first[:3] + (price_usd,)
+            else:
+                stored[(date[:10], metal)] = (date, price_usd, price_change, price_usd)
+        return stored
+    except sqlite3.Error as e:
+        logger.error("Database error fetching stored days from %s to %s: %s", start, end, e)
+        return None
+
+def insert_prices_bulk(conn: sqlite3.Connection, rows: list[tuple[str, str, float, float]]) -> int:
+    """
+    Inserts price rows in a single transaction, skipping (date, metal) pairs that already exist.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        rows (list[tuple[str, str, float, float]]): Rows of (date, metal, price_usd, price_change).
+
+    Returns:
+        int: Number of rows inserted (0 on error).
+    """
+    try:
+        with conn:
+            cursor = conn.executemany(_INSERT_PRICES_SQL, rows)
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error("Database error inserting %s rows: %s", len(rows), e)
+        return 0
+
+def save_backfill(conn: sqlite3.Connection, rows: list[tuple[str, str, float, float]],
+                  updates: list[tuple[float, str, str]]) -> tuple[int, int] | None:
+    """
+    Inserts new price rows and updates stored changes in one transaction, so updated
+    changes never refer to rows that were not stored.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        rows (list[tuple[str, str, float, float]]): Rows of (date, metal, price_usd, price_change).
+        updates (list[tuple[float, str, str]]): Rows of (price_change, date, metal).
+
+    Returns:
+        tuple[int, int]: (rows inserted, rows updated), or None on error (nothing is written).
+    """
+    try:
+        with conn:
+            inserted = conn.executemany(_INSERT_PRICES_SQL, rows).rowcount
+            updated = conn.executemany(_UPDATE_CHANGES_SQL, updates).rowcount
+        return inserted, updated
+    except sqlite3.Error as e:
+        logger.error("Database error saving %s rows and %s price changes: %s", len(rows), len(updates), e)
         return None
 
 def insert_price(conn: sqlite3.Connection, date: str, metal: str, price_usd: float,
                 price_change: float) -> bool:
     """
-    Inserts new price data into the database if the date is newer than the latest entry.
+    Inserts price data into the database unless a row for the same date and metal exists.
 
     Args:
         conn (sqlite3.Connection): Database connection.
@@ -75,37 +213,20 @@ def insert_price(conn: sqlite3.Connection, date: str, metal: str, price_usd: flo
         price_change (float): Percentage change.
 
     Returns:
-        bool: True if insertion succeeded, False otherwise.
+        bool: True if a row was inserted, False otherwise.
     """
+    # Validate inputs
+    if not date or not metal or price_usd is None:
+        logger.error("Invalid input for %s: date=%r, price_usd=%s", metal, date, price_usd)
+        return False
     try:
-        # Validate inputs
-        if not date or not metal or price_usd is None:
-            logger.error(f"Invalid input for {metal}: date={sqlite3.sql_escape_string(str(date))}, price_usd={price_usd}")
-            return False
-
-        # Check latest date for the metal
-        latest = get_latest_price(conn, metal)
-        latest_date = latest[1] if latest else None
-        if latest_date:
-            try:
-                if datetime.fromisoformat(date) <= datetime.fromisoformat(latest_date):
-                    logger.info(f"Data for {metal} on {date} is not newer than {latest_date}. Skipping.")
-                    return False
-            except ValueError as e:
-                logger.error(f"Invalid date format for {metal}: {date}. Error: {str(e)}")
-                return False
-
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO PreciousMetals (date, metal, price_usd, price_change)
-            VALUES (?, ?, ?, ?)
-        """, (date, metal, price_usd, price_change))
-        conn.commit()
-        logger.info(f"Price data inserted for {metal} on {date}.")
-        return True
-    except sqlite3.Error as e:
-        logger.error(f"Database error inserting for {metal}: {str(e)}")
+        datetime.fromisoformat(date)
+    except (ValueError, TypeError) as e:
+        logger.error("Invalid date format for %s: %s. Error: %s", metal, date, e)
         return False
-    except Exception as e:
-        logger.error(f"Unexpected error inserting for {metal}: {str(e)}")
+
+    if not insert_prices_bulk(conn, [(date, metal, price_usd, price_change)]):
+        logger.info("Price data for %s on %s not inserted.", metal, date)
         return False
+    logger.info("Price data inserted for %s on %s.", metal, date)
+    return True
@@ -1,9 +1,10 @@
 import logging
 import os
+from config.config import ERROR_LOG, EXTREME_LOG
 
-def setup_logger(logfile: str = "logs/errors.log") -> logging.Handler:
+def _file_handler(logfile: str) -> logging.Handler:
     """
-    Configures logging to a file.
+    Creates a file handler with the application's log format.
 
     Args:
         logfile (str): Path to the log file.
@@ -17,3 +18,25 @@ def setup_logger(logfile: str = "logs/errors.log") -> logging.Handler:
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     ))
     return handler
+
+def configure_logging(error_log: str = ERROR_LOG, extreme_log: str = EXTREME_LOG) -> None:
+    """
+    Attaches file handlers to the application loggers. Safe to call more than once.
+
+    All "gold_silver_etl.*" loggers propagate to the app logger, which writes to the
+    error log. Extreme movements are logged at INFO level to their own log only and
+    do not reach the error log.
+
+    Args:
+        error_log (str): Path to the error/info log file.
+        extreme_log (str): Path to the extreme movements log file.
+    """
+    app_logger = logging.getLogger("gold_silver_etl")
+    if app_logger.handlers:
+        return
+    app_logger.addHandler(_file_handler(error_log))
+
+    extreme_logger = logging.getLogger("gold_silver_etl.transform.extreme")
+    extreme_logger.setLevel(logging.INFO)
+    extreme_logger.addHandler(_file_handler(extreme_log))
+    extreme_logger.propagate = False
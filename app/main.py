@@ -1,16 +1,14 @@
 # Main script to run the ETL pipeline: fetch prices, transform, load to database, and visualize.
 
 import logging
-from app.logger import setup_logger
 from app.api import fetch_metal_prices
 from app.transform import transform_prices
-from app.database import create_connection, get_latest_price, insert_price
+from app.database import create_connection, close_connection, get_latest_price, insert_price
 from app.visualize import create_price_plot
-from config.config import ERROR_LOG
+from app.logger import configure_logging
 
-# Setup logger
+# Logger
 logger = logging.getLogger("gold_silver_etl.main")
-logger.addHandler(setup_logger(logfile=ERROR_LOG))
 logger.setLevel(logging.INFO)
 
 def run_etl():
@@ -38,39 +36,28 @@ def run_etl():
         previous_gold_price = previous_gold[0] if previous_gold else None
         previous_silver_price = previous_silver[0] if previous_silver else None
 
-        # Step 4: Transform
-        transformed = transform_prices(prices, previous_gold_price, previous_silver_price)
+        # Step 4: Transform (prices were already checked by fetch_metal_prices)
+        transformed = transform_prices(prices, previous_gold_price, previous_silver_price, validate=False)
         if not transformed:
             logger.error("ETL stopped: transformation failed.")
             return
         gold_data, silver_data = transformed
 
         # Step 5: Load
-        inserted_gold = insert_price(
-            conn, 
-            gold_data["date"], 
-            gold_data["metal"], 
-            gold_data["price_usd"], 
-            gold_data["price_change"]
-        )
-        inserted_silver = insert_price(
-            conn, 
-            silver_data["date"], 
-            silver_data["metal"], 
-            silver_data["price_usd"], 
-            silver_data["price_change"]
-        )
+        inserted_gold = insert_price(conn, *gold_data)
+        inserted_silver = insert_price(conn, *silver_data)
 
         if inserted_gold or inserted_silver:
             logger.info("New data inserted. Creating price plot.")
-            create_price_plot()
+            create_price_plot(conn)
         else:
             logger.info("No new data inserted. Skipping plot creation.")
 
     except Exception as e:
-        logger.error(f"ETL pipeline failed: {str(e)}")
+        logger.error("ETL pipeline failed: %s", e)
     finally:
-        conn.close()
+        close_connection(conn)
 
 if __name__ == "__main__":
+    configure_logging()
     run_etl()
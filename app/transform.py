@@ -1,18 +1,30 @@
 # Module for transforming fetched price data: change calculation, validation, and extreme movement flagging.
 
 import logging
+import numpy as np
 from datetime import datetime
-from typing import Dict, Optional, Tuple
-from app.logger import setup_logger
-from config.config import EXTREME_THRESHOLD, ERROR_LOG, EXTREME_LOG
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from config.config import EXTREME_THRESHOLD
 
-# Setup loggers: one for errors, one for extreme movements
+# Loggers: one for errors, one for extreme movements
 error_logger = logging.getLogger("gold_silver_etl.transform.errors")
-error_logger.addHandler(setup_logger(logfile=ERROR_LOG))
 
 extreme_logger = logging.getLogger("gold_silver_etl.transform.extreme")
-extreme_logger.addHandler(setup_logger(logfile=EXTREME_LOG))
-extreme_logger.setLevel(logging.INFO)  # Log extreme events at INFO level
+
+class PriceRecord(NamedTuple):
+    """A transformed price row, in PreciousMetals column order."""
+    date: str
+    metal: str
+    price_usd: float
+    price_change: float
+
+class BackfillDay(NamedTuple):
+    """One day of a metal's historical backfill series, either newly fetched or already stored."""
+    date: str
+    price_usd: float
+    closing_usd: float  # Last stored price of the day, used for the next day's change
+    is_new: bool
+    stored_change: Optional[float]  # None for newly fetched days
 
 def validate_data(prices: Dict[str, any]) -> bool:
     """
@@ -34,7 +46,7 @@ def validate_data(prices: Dict[str, any]) -> bool:
         float(prices["silver-token-xagx"])
         datetime.fromisoformat(prices["timestamp"])
     except (ValueError, TypeError) as e:
-        error_logger.error(f"Invalid data types in prices: {str(e)}")
+        error_logger.error("Invalid data types in prices: %s", e)
         return False
     
     return True
@@ -57,9 +69,26 @@ def calculate_change(previous_usd: float, current_usd: float) -> float:
         change = ((current_usd - previous_usd) / previous_usd) * 100
         return round(change, 2)  
     except (TypeError, ValueError) as e:
-        error_logger.error(f"Error calculating change: {str(e)}")
+        error_logger.error("Error calculating change: %s", e)
         return 0.0
 
+def calculate_changes(previous_usd: np.ndarray, current_usd: np.ndarray) -> np.ndarray:
+    """
+    Calculates percentage changes element-wise for arrays of prices.
+
+    Args:
+        previous_usd (np.ndarray): Previous USD prices.
+        current_usd (np.ndarray): Current USD prices.
+
+    Returns:
+        np.ndarray: Percentage changes rounded to 2 decimals, 0.0 where the previous price is zero.
+    """
+    previous_usd = np.asarray(previous_usd, dtype=float)
+    current_usd = np.asarray(current_usd, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = np.where(previous_usd != 0, (current_usd - previous_usd) / previous_usd * 100, 0.0)
+    return np.round(changes, 2)
+
 def flag_extreme_movement(metal: str, timestamp: str, change: float) -> None:
     """
     Flags and logs extreme price movements if above threshold.
@@ -71,10 +100,11 @@ def flag_extreme_movement(metal: str, timestamp: str, change: float) -> None:
     """
     if abs(change) > EXTREME_THRESHOLD:
         direction = "+" if change > 0 else "-"
-        extreme_logger.info(f"{timestamp} - Extreme price movement for {metal}: {direction}{abs(change)}%")
+        extreme_logger.info("%s - Extreme price movement for %s: %s%s%%", timestamp, metal, direction, abs(change))
 
 def transform_prices(prices: Dict[str, any], previous_gold: Optional[float] = None, 
-                     previous_silver: Optional[float] = None) -> Optional[Tuple[Dict[str, any], Dict[str, any]]]:
+                     previous_silver: Optional[float] = None,
+                     validate: bool = True) -> Optional[Tuple[PriceRecord, PriceRecord]]:
     """
     Transforms the fetched prices: validates, calculates changes, flags extremes.
 
@@ -82,36 +112,58 @@ def transform_prices(prices: Dict[str, any], previous_gold: Optional[float] = No
         prices (Dict[str, any]): Raw prices from API.
         previous_gold (Optional[float]): Previous gold USD price from DB.
         previous_silver (Optional[float]): Previous silver USD price from DB.
+        validate (bool): Run validate_data first. Callers whose input is already
+            checked (e.g. fetch_metal_prices) can skip it.
 
     Returns:
-        Optional[Tuple[Dict, Dict]]: Transformed data for gold and silver, or None if invalid.
+        Optional[Tuple[PriceRecord, PriceRecord]]: Transformed data for gold and silver, or None if invalid.
     """
-    if not validate_data(prices):
+    if validate and not validate_data(prices):
         return None
     
     timestamp = prices["timestamp"]
-    
-    gold_usd = prices["pax-gold"]
-    gold_change = calculate_change(previous_gold or 0, gold_usd) if previous_gold else 0.0
+    # Validation only guarantees the prices convert to float, so convert them here
+    gold_usd = float(prices["pax-gold"])
+    silver_usd = float(prices["silver-token-xagx"])
+
+    gold_change = calculate_change(previous_gold, gold_usd) if previous_gold else 0.0
+    silver_change = calculate_change(previous_silver, silver_usd) if previous_silver else 0.0
     flag_extreme_movement("gold", timestamp, gold_change)
-    
-    silver_usd = prices["silver-token-xagx"]
-    silver_change = calculate_change(previous_silver or 0, silver_usd) if previous_silver else 0.0
     flag_extreme_movement("silver", timestamp, silver_change)
     
-    gold_data = {
-        "date": timestamp,
-        "metal": "gold",
-        "price_usd": gold_usd,
-        "price_change": gold_change
-    }
-    
-    silver_data = {
-        "date": timestamp,
-        "metal": "silver",
-        "price_usd": silver_usd,
-        "price_change": silver_change
-    }
-    
     error_logger.info("Data transformation successful.")
-    return gold_data, silver_data
+    return (PriceRecord(timestamp, "gold", gold_usd, gold_change),
+            PriceRecord(timestamp, "silver", silver_usd, silver_change))
+
+def build_backfill(metal: str, series: List[BackfillDay],
+                   previous_usd: Optional[float]) -> Tuple[List[PriceRecord], List[Tuple[float, str, str]]]:
+    """
+    Calculates changes for one metal's daily backfill series against the previous day's closing price.
+
+    Args:
+        metal (str): Metal name.
+        series (List[BackfillDay]): One entry per day, in date order.
+        previous_usd (Optional[float]): Closing price of the day before the series.
+
+    Returns:
+        Tuple: New rows to insert, and (price_change, date, metal) updates for stored days
+            whose change differs now that the gap before them was filled.
+    """
+    rows = []
+    updates = []
+    if not series:
+        return rows, updates
+    closes = [day.closing_usd for day in series]
+    previous = np.concatenate(([previous_usd or 0.0], closes))[:-1]
+    prices = np.array([day.price_usd for day in series], dtype=float)
+    changes = calculate_changes(previous, prices).tolist()
+    after_new = False
+    for day, change in zip(series, changes):
+        if day.is_new:
+            flag_extreme_movement(metal, day.date, change)
+            rows.append(PriceRecord(day.date, metal, day.price_usd, change))
+        elif after_new and change != day.stored_change:
+            flag_extreme_movement(metal, day.date, change)
+            updates.append((change, day.date, metal))
+        after_new = day.is_new
+    return rows, updates
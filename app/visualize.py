@@ -3,46 +3,90 @@
 import sqlite3
 import logging
 import matplotlib.pyplot as plt
+import numpy as np
 from datetime import datetime
-from typing import List, Tuple
-from app.logger import setup_logger
-from app.database import create_connection
-from config.config import ERROR_LOG, EXTREME_THRESHOLD
+from typing import Tuple
+from app.database import create_connection, close_connection
+from config.config import EXTREME_THRESHOLD
 
-# Setup logger
+# Logger
 logger = logging.getLogger("gold_silver_etl.visualize")
-logger.addHandler(setup_logger(logfile=ERROR_LOG))
 
-def fetch_prices_for_plotting(conn: sqlite3.Connection) -> Tuple[List[Tuple[str, float, float]], List[Tuple[str, float, float]]]:
+# Parallel arrays of dates (datetime64), prices and percentage changes for one metal
+PriceArrays = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def empty_price_arrays(n: int) -> PriceArrays:
+    """Allocates uninitialised arrays for n rows of dates, prices and changes.
+    
+    Args:
+        n (int): Number of rows.
+    
+    Returns:
+        PriceArrays: Dates, prices and changes arrays of length n.
+    """
+    return np.empty(n, dtype="datetime64[s]"), np.empty(n), np.empty(n)
+
+def fetch_prices_for_plotting(conn: sqlite3.Connection) -> Tuple[PriceArrays, PriceArrays]:
     """Fetches all price data from the database for gold and silver.
     
+    Rows are streamed from the cursor into arrays preallocated from a row count,
+    so no intermediate lists of tuples are built. Missing changes become NaN.
+    
     Args:
         conn (sqlite3.Connection): Database connection.
     
     Returns:
-        Tuple[List[Tuple[str, float, float]], List[Tuple[str, float, float]]]: Lists of (date, price_usd, 
-        price_change) for gold and silver.
+        Tuple[PriceArrays, PriceArrays]: Arrays of dates, price_usd and price_change for gold and silver.
     """
+    # Count and select in one read transaction so both see the same snapshot,
+    # unless the caller already has a transaction open
+    own_transaction = not conn.in_transaction
     try:
+        if own_transaction:
+            conn.execute("BEGIN")
         cursor = conn.cursor()
-        cursor.execute("SELECT date, price_usd, price_change FROM PreciousMetals WHERE metal = 'gold' ORDER BY date")
-        gold_data = cursor.fetchall()
-        cursor.execute("SELECT date, price_usd, price_change FROM PreciousMetals WHERE metal = 'silver' ORDER BY date")
-        silver_data = cursor.fetchall()
+        cursor.execute("""
+            SELECT metal, COUNT(*) FROM PreciousMetals
+            WHERE metal IN ('gold', 'silver') GROUP BY metal
+        """)
+        counts = {"gold": 0, "silver": 0}
+        counts.update(cursor.fetchall())
+        arrays = {metal: empty_price_arrays(n) for metal, n in counts.items()}
+        positions = {"gold": 0, "silver": 0}
+
+        # One query for both metals; "metal DESC, date" follows idx_metal_date backwards without a sort
+        cursor.execute("""
+            SELECT metal, date, price_usd, price_change FROM PreciousMetals
+            WHERE metal IN ('gold', 'silver') ORDER BY metal DESC, date
+        """)
+        for metal, date, price_usd, price_change in cursor:
+            i = positions[metal]
+            dates, prices, changes = arrays[metal]
+            dates[i], prices[i], changes[i] = date, price_usd, price_change
+            positions[metal] = i + 1
         logger.info("Fetched price data for plotting.")
-        return gold_data, silver_data
+        return arrays["gold"], arrays["silver"]
     except sqlite3.Error as e:
-        logger.error(f"Database error fetching prices for plotting: {str(e)}")
-        return [], []
+        logger.error("Database error fetching prices for plotting: %s", e)
+        return empty_price_arrays(0), empty_price_arrays(0)
+    finally:
+        if own_transaction and conn.in_transaction:
+            conn.commit()
 
-def create_price_plot() -> bool: 
+def create_price_plot(conn: sqlite3.Connection | None = None) -> bool: 
     """ 
     Creates a line plot of gold and silver prices over time, marking extreme movements. 
  
+    Args: 
+        conn (sqlite3.Connection | None): Open database connection to reuse. If None, a 
+            connection is opened and closed by this function. 
+ 
     Returns: 
         bool: True if plot saved successfully, False otherwise. 
     """ 
-    conn = create_connection() 
+    owns_conn = conn is None 
+    if owns_conn: 
+        conn = create_connection() 
     if not conn: 
         logger.error("Cannot create plot: database connection failed.") 
         return False 
@@ -50,18 +94,13 @@ def create_price_plot() -> bool:
     try: 
         gold_data, silver_data = fetch_prices_for_plotting(conn) 
          
-        if not gold_data and not silver_data: 
+        if not gold_data[0].size and not silver_data[0].size: 
             logger.error("No data available for plotting.") 
             return False 
  
         # Prepare data for plotting 
-        gold_dates = [datetime.fromisoformat(row[0]) for row in gold_data] 
-        gold_prices = [row[1] for row in gold_data] 
-        gold_changes = [row[2] for row in gold_data] 
-         
-        silver_dates = [datetime.fromisoformat(row[0]) for row in silver_data] 
-        silver_prices = [row[1] for row in silver_data] 
-        silver_changes = [row[2] for row in silver_data] 
+        gold_dates, gold_prices, gold_changes = gold_data 
+        silver_dates, silver_prices, silver_changes = silver_data 
  
         # Create plot with dual y-axes 
         fig, ax1 = plt.subplots(figsize=(10, 6)) 
@@ -78,14 +117,14 @@ def create_price_plot() -> bool:
         ax2.set_ylabel("Silver Price (USD/oz)", color="silver") 
         ax2.tick_params(axis='y', labelcolor="silver") 
  
-        # Mark extreme movements 
-        for date, price, change in gold_data: 
-            if abs(change) > EXTREME_THRESHOLD: 
-                ax1.scatter([datetime.fromisoformat(date)], [price], color="red", s=50, marker="*") 
+        # Mark extreme movements with one scatter call per axis 
+        gold_extreme = np.abs(gold_changes) > EXTREME_THRESHOLD 
+        if gold_extreme.any(): 
+            ax1.scatter(gold_dates[gold_extreme], gold_prices[gold_extreme], color="red", s=50, marker="*") 
  
-        for date, price, change in silver_data: 
-            if abs(change) > EXTREME_THRESHOLD: 
-                ax2.scatter([datetime.fromisoformat(date)], [price], color="red", s=50, marker="*") 
+        silver_extreme = np.abs(silver_changes) > EXTREME_THRESHOLD 
+        if silver_extreme.any(): 
+            ax2.scatter(silver_dates[silver_extreme], silver_prices[silver_extreme], color="red", s=50, marker="*") 
  
         # Set x-axis to 2025 only 
         ax1.set_xlim(datetime(2025, 1, 1), datetime(2025, 12, 31)) 
@@ -104,7 +143,8 @@ def create_price_plot() -> bool:
         logger.info("Price plot saved to results/prices.png.") 
         return True 
     except Exception as e: 
-        logger.error(f"Error creating price plot: {str(e)}") 
+        logger.error("Error creating price plot: %s", e) 
         return False 
     finally: 
-        conn.close()
+        if owns_conn: 
+            close_connection(conn)
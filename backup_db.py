@@ -1,4 +1,4 @@
-import shutil
+import sqlite3
 import datetime
 import os
 
@@ -9,6 +9,12 @@ backup_path = f"data/prices_backup_{datetime.datetime.now().strftime('%Y%m%d_%H%
 # Create backup directory if it doesn't exist
 os.makedirs(os.path.dirname(backup_path), exist_ok=True)
 
-# Copy DB to backup
-shutil.copy2(db_path, backup_path)
+# Copy DB to backup with SQLite's backup API, which includes commits still in the WAL file
+source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)  # Fails if the DB is missing
+target = sqlite3.connect(backup_path)
+try:
+    source.backup(target)
+finally:
+    target.close()
+    source.close()
 print(f"Backup created at {backup_path}")
\ No newline at end of file
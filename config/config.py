@@ -4,6 +4,9 @@ COINGECKO_API_KEY = "CG-MPqmxjGtWHVYMZvnL2jmv3ko"
 # DB settings
 DATABASE_PATH = "data/prices.db"
 
+# HTTP cache for historical API responses
+HTTP_CACHE_PATH = "data/http_cache.sqlite"
+
 # Transformation
 EXTREME_THRESHOLD = 5.0  # Percentage threshold for extreme price movements
 
@@ -2,73 +2,144 @@ import datetime
 import time
 import requests
 import logging
-from config.config import COINGECKO_API_KEY, EXTREME_THRESHOLD, ERROR_LOG, EXTREME_LOG 
-from app.logger import setup_logger
-from app.database import create_connection, get_latest_price, insert_price
-from app.transform import calculate_change, flag_extreme_movement 
+from concurrent.futures import ThreadPoolExecutor
+from requests_cache import CachedSession, NEVER_EXPIRE
+from config.config import COINGECKO_API_KEY, HTTP_CACHE_PATH
+from app.logger import configure_logging
+from app.api import create_session
+from app.database import (create_connection, close_connection, get_latest_price, get_next_price,
+                          get_stored_days, save_backfill)
+from app.transform import BackfillDay, build_backfill
 
-# Setup logger
+# Logger
 logger = logging.getLogger("gold_silver_etl.populate_historical")
-logger.addHandler(setup_logger(logfile=ERROR_LOG))
 logger.setLevel(logging.INFO)
 
-def fetch_historical_price(coin_id: str, date_str: str) -> float | None:
-    """Fetch historical USD price for a given coin and date from CoinGecko."""
-    url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/history"
-    params = {
-        "date": datetime.datetime.strptime(date_str, '%Y-%m-%d').strftime('%d-%m-%Y'),  
-        "localization": "false",
-        "x_cg_demo_api_key": COINGECKO_API_KEY
-    }
+METALS = [('gold', 'pax-gold'), ('silver', 'silver-token-xagx')]
+MAX_REQUESTS_PER_MINUTE = 25  # Below CoinGecko's demo limit to leave headroom for 429s
+
+HISTORY_URL = "https://api.coingecko.com/api/v3/coins/{}/history"
+HISTORY_PARAMS = {
+    "localization": "false",
+    "x_cg_demo_api_key": COINGECKO_API_KEY
+}
+
+def create_cached_session() -> requests.Session:
+    """Create a pooled session that caches historical responses on disk indefinitely, since they never change."""
+    return create_session(CachedSession(
+        HTTP_CACHE_PATH,
+        expire_after=NEVER_EXPIRE,
+        allowable_codes=(200,),
+        ignored_parameters=["x_cg_demo_api_key"],
+    ))
+
+def fetch_historical_price(session: requests.Session, coin_id: str, api_date: str) -> tuple[float | None, bool]:
+    """Fetch historical USD price for a given coin and date (dd-mm-yyyy) from CoinGecko.
+
+    Returns (price or None, whether the response came from the HTTP cache)."""
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = session.get(HISTORY_URL.format(coin_id), params={**HISTORY_PARAMS, "date": api_date}, timeout=10)
         response.raise_for_status()
+        from_cache = getattr(response, "from_cache", False)
         data = response.json()
         price_usd = data.get('market_data', {}).get('current_price', {}).get('usd')
         if price_usd is None:
-            logger.error(f"No USD price found for {coin_id} on {date_str}")
-            return None
-        return float(price_usd)
+            logger.error("No USD price found for %s on %s", coin_id, api_date)
+            return None, from_cache
+        return float(price_usd), from_cache
     except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to fetch historical price for {coin_id} on {date_str}: {e}")
-        return None
+        logger.error("Failed to fetch historical price for %s on %s: %s", coin_id, api_date, e)
+        return None, False
 
 # Start and end dates for 2025 so far
 start_date = datetime.date(2025, 1, 1)
 end_date = datetime.date(2025, 8, 31)  
 delta = datetime.timedelta(days=1)
 
-conn = create_connection()
-if not conn:
-    logger.error("Failed to connect to database. Aborting.")
-    exit(1)
+def main() -> None:
+    """Backfill daily prices for the period, filling only the days not already stored."""
+    conn = create_connection()
+    if not conn:
+        logger.error("Failed to connect to database. Aborting.")
+        exit(1)
+
+    try:
+        # Price per metal from the newest row before the period, tracked in memory from there on.
+        # Rows from later live runs must not hide it.
+        start_str = start_date.isoformat() + "T00:00:00"
+        end_str = (end_date + delta).isoformat()  # Exclusive bound, so rows stamped late on end_date count
+        prev_prices = {}
+        for metal, _ in METALS:
+            prev = get_latest_price(conn, metal, before=start_str)
+            prev_prices[metal] = prev[0] if prev else None
+
+        # Days already stored for the period, matched by calendar day so live ETL rows count too
+        stored = get_stored_days(conn, start_str, end_str)
+        if stored is None:
+            logger.error("Failed to read stored days. Aborting.")
+            exit(1)
+
+        # Per metal, one BackfillDay per day
+        fetched = {metal: [] for metal, _ in METALS}
+        day_interval = len(METALS) * 60 / MAX_REQUESTS_PER_MINUTE
+        current_date = start_date
+        session = create_cached_session()
+        with session, ThreadPoolExecutor(max_workers=len(METALS)) as executor:
+            while current_date <= end_date:
+                started = time.monotonic()
+                date_str = current_date.isoformat() + "T00:00:00"  
+                api_date = current_date.strftime('%d-%m-%Y')
+
+                to_fetch = []
+                for metal, coin_id in METALS:
+                    day = stored.get((date_str[:10], metal))
+                    if day:
+                        first_date, first_price, first_change, last_price = day
+                        fetched[metal].append(BackfillDay(first_date, first_price, last_price, False, first_change))
+                    else:
+                        to_fetch.append((metal, coin_id))
+
+                # Fetch the missing metals for the day in parallel
+                coin_ids = [coin_id for _, coin_id in to_fetch]
+                results = list(executor.map(lambda coin_id: fetch_historical_price(session, coin_id, api_date), coin_ids))
 
-try:
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.isoformat() + "T00:00:00"  
-        date_only = current_date.strftime('%Y-%m-%d')
+                for (metal, coin_id), (price_usd, _) in zip(to_fetch, results):
+                    if price_usd is None:
+                        continue
+                    fetched[metal].append(BackfillDay(date_str, price_usd, price_usd, True, None))
 
-        for metal, coin_id in [('gold', 'pax-gold'), ('silver', 'silver-token-xagx')]:
-            price_usd = fetch_historical_price(coin_id, date_only)
-            if price_usd is None:
-                continue
+                # Wait out the remainder of the day's share of the rate limit, unless nothing hit the network
+                if not all(from_cache for _, from_cache in results):
+                    time.sleep(max(0.0, day_interval - (time.monotonic() - started)))
+                current_date += delta
 
-            # Get previous price from DB 
-            prev = get_latest_price(conn, metal)
-            prev_price = prev[0] if prev and datetime.datetime.fromisoformat(prev[1]) < datetime.datetime.fromisoformat(date_str) else None
+        # The first stored row after the period follows the last day, so a gap filled there affects its change
+        for metal, series in fetched.items():
+            next_row = get_next_price(conn, metal, end_str)
+            if next_row:
+                price_usd, date_str, price_change = next_row
+                series.append(BackfillDay(date_str, price_usd, price_usd, False, price_change))
 
-            price_change = calculate_change(prev_price, price_usd) if prev_price else 0.0
-            flag_extreme_movement(metal, date_str, price_change)
+        # Calculate all changes per metal at once; stored days after a filled gap get recalculated
+        rows = []
+        updates = []
+        for metal, series in fetched.items():
+            metal_rows, metal_updates = build_backfill(metal, series, prev_prices[metal])
+            rows.extend(metal_rows)
+            updates.extend(metal_updates)
 
-            # Insert
-            inserted = insert_price(conn, date_str, metal, price_usd, price_change)
-            if inserted:
-                logger.info(f"Inserted historical data for {metal} on {date_str}")
+        # Insert rows and update changes in a single transaction; UNIQUE(date, metal) skips existing rows
+        saved = save_backfill(conn, rows, updates)
+        if saved is None:
+            logger.error("Failed to save historical data. Nothing was written.")
+            exit(1)
+        logger.info("Inserted %s historical rows out of %s fetched, updated %s stored changes",
+                    saved[0], len(rows), saved[1])
+    finally:
+        close_connection(conn)
 
-        time.sleep(10)  # Wait 10 sec for rate limit
-        current_date += delta
-finally:
-    conn.close()
+    print("Historical data populated successfully.")
 
-print("Historical data populated successfully.")
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -1,14 +1,26 @@
 import unittest
+import numpy as np
 import requests
 from unittest.mock import patch, MagicMock, mock_open
 import logging
-from app.transform import validate_data, calculate_change, flag_extreme_movement
+from app.transform import (validate_data, calculate_change, calculate_changes, flag_extreme_movement, transform_prices,
+                           BackfillDay, build_backfill)
 from app.api import fetch_metal_prices
-from app.database import create_connection, get_latest_price, insert_price
+from app.database import (create_connection, get_latest_price, get_next_price, get_stored_days, insert_price, insert_prices_bulk,
+                          save_backfill)
+from app.visualize import fetch_prices_for_plotting
 from config.config import EXTREME_THRESHOLD
 
 class TestPrices(unittest.TestCase):
 
+    def memory_connection(self):
+        """Opens an in-memory database with the real schema via create_connection."""
+        with patch('app.database.DATABASE_PATH', ":memory:"):
+            conn = create_connection()
+        self.assertIsNotNone(conn)
+        self.addCleanup(conn.close)
+        return conn
+
     def test_validate_data(self):
         """Test validation of API data."""
         valid_data = {"pax-gold": 2000.0, "silver-token-xagx": 30.0, "timestamp": "2025-08-31T12:00:00"}
@@ -27,17 +39,39 @@ class TestPrices(unittest.TestCase):
         self.assertEqual(calculate_change(0, 1000), 0.0)  # Div by zero -> 0.0
         self.assertEqual(calculate_change("invalid", 1000), 0.0)  # Invalid -> 0.0
 
+    def test_calculate_changes(self):
+        """Test vectorized percentage change calculation."""
+        changes = calculate_changes([1000, 1000, 0], [1050, 950, 1000])
+        self.assertEqual(changes.tolist(), [5.0, -5.0, 0.0])  # Div by zero -> 0.0
+
+    def test_transform_prices(self):
+        """Test transformation into gold and silver records."""
+        prices = {"pax-gold": 2100.0, "silver-token-xagx": 30.0, "timestamp": "2025-08-31T12:00:00"}
+        gold, silver = transform_prices(prices, 2000.0, None)
+        self.assertEqual(gold, ("2025-08-31T12:00:00", "gold", 2100.0, 5.0))
+        self.assertEqual(silver.price_change, 0.0)  # No previous price -> 0.0
+
+        self.assertIsNone(transform_prices({"pax-gold": 2100.0}))
+
+    def test_transform_prices_string_values(self):
+        """Test that numeric strings accepted by validation are converted to floats."""
+        prices = {"pax-gold": "2100.0", "silver-token-xagx": "30.45", "timestamp": "2025-08-31T12:00:00"}
+        gold, silver = transform_prices(prices, 2000.0, 29.0)
+        self.assertEqual(gold, ("2025-08-31T12:00:00", "gold", 2100.0, 5.0))
+        self.assertEqual(silver, ("2025-08-31T12:00:00", "silver", 30.45, 5.0))
+
     def test_flag_extreme_movement(self):
         """Test flagging of extreme movements (check logging)."""
         with patch('logging.Logger.info') as mock_info:
             flag_extreme_movement("gold", "2025-08-31T12:00:00", 6.0)
-            mock_info.assert_called_with("2025-08-31T12:00:00 - Extreme price movement for gold: +6.0%")
+            msg, *args = mock_info.call_args.args
+            self.assertEqual(msg % tuple(args), "2025-08-31T12:00:00 - Extreme price movement for gold: +6.0%")
         
         with patch('logging.Logger.info') as mock_info:
             flag_extreme_movement("silver", "2025-08-31T12:00:00", -4.0)
             mock_info.assert_not_called()  # < threshold
 
-    @patch('requests.get')
+    @patch('app.api._session.get')
     def test_fetch_metal_prices_success(self, mock_get):
         """Test API fetching with mocked response."""
         mock_response = MagicMock()
@@ -53,7 +87,7 @@ class TestPrices(unittest.TestCase):
         self.assertIn("pax-gold", prices)
         self.assertIn("timestamp", prices)
 
-    @patch('requests.get')
+    @patch('app.api._session.get')
     def test_fetch_metal_prices_failure(self, mock_get):
         """Test API error handling."""
         mock_get.side_effect = requests.exceptions.RequestException("API error")
@@ -77,13 +111,146 @@ class TestPrices(unittest.TestCase):
         """Test insertion with a mocked DB."""
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.rowcount = 1
+        mock_conn.executemany.return_value = mock_cursor
         mock_connect.return_value = mock_conn
         
-        with patch('app.database.get_latest_price', return_value=(2000.0, "2025-08-30T12:00:00")):
-            inserted = insert_price(mock_conn, "2025-08-31T12:00:00", "gold", 2100.0, 5.0)
-            self.assertTrue(inserted)
-            mock_cursor.execute.assert_called()
+        inserted = insert_price(mock_conn, "2025-08-31T12:00:00", "gold", 2100.0, 5.0)
+        self.assertTrue(inserted)
+        mock_conn.executemany.assert_called_once()
+
+        mock_cursor.rowcount = 0  # Duplicate (date, metal) is ignored by SQLite
+        inserted = insert_price(mock_conn, "2025-08-31T12:00:00", "gold", 2100.0, 5.0)
+        self.assertFalse(inserted)
+
+    def test_insert_prices_bulk(self):
+        """Test bulk insertion into an in-memory database, ignoring duplicates."""
+        conn = self.memory_connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone(), ("memory",))  # WAL skipped
+        rows = [("2025-08-30T00:00:00", "gold", 2000.0, 0.0), ("2025-08-31T00:00:00", "gold", 2100.0, 5.0)]
+        self.assertEqual(insert_prices_bulk(conn, rows), 2)
+        self.assertEqual(insert_prices_bulk(conn, rows), 0)
+        self.assertEqual(get_latest_price(conn, "gold"), (2100.0, "2025-08-31T00:00:00"))
+
+    def test_get_latest_price_before(self):
+        """Test that a row before a date is found even when later rows exist."""
+        conn = self.memory_connection()
+        insert_prices_bulk(conn, [
+            ("2024-12-31T00:00:00", "gold", 100.0, 0.0),
+            ("2025-01-01T00:00:00", "gold", 101.0, 1.0),
+            ("2025-09-10T17:03:00.123456", "gold", 150.0, 2.0),
+        ])
+        self.assertEqual(get_latest_price(conn, "gold", before="2025-01-01T00:00:00"),
+                         (100.0, "2024-12-31T00:00:00"))
+        self.assertEqual(get_latest_price(conn, "gold"), (150.0, "2025-09-10T17:03:00.123456"))
+        self.assertIsNone(get_latest_price(conn, "gold", before="2024-12-31T00:00:00"))
+
+    def test_save_backfill(self):
+        """Test that inserts and updates commit together and roll back together."""
+        conn = self.memory_connection()
+        insert_prices_bulk(conn, [("2025-01-03T00:00:00", "gold", 121.0, 21.0)])
+        self.assertEqual(save_backfill(conn, [("2025-01-02T00:00:00", "gold", 110.0, 10.0)],
+                                       [(10.0, "2025-01-03T00:00:00", "gold")]), (1, 1))
+
+        with patch('app.database._UPDATE_CHANGES_SQL', "UPDATE Missing SET x = ? WHERE y = ? AND z = ?"):
+            self.assertIsNone(save_backfill(conn, [("2025-01-04T00:00:00", "gold", 133.1, 10.0)],
+                                            [(0.0, "2025-01-03T00:00:00", "gold")]))
+        self.assertEqual(conn.execute("SELECT date, price_change FROM PreciousMetals ORDER BY date").fetchall(),
+                         [("2025-01-02T00:00:00", 10.0), ("2025-01-03T00:00:00", 10.0)])  # Insert rolled back
+
+    def test_get_next_price(self):
+        """Test fetching the first row on or after a date."""
+        conn = self.memory_connection()
+        insert_prices_bulk(conn, [
+            ("2025-08-31T23:59:59.123456", "gold", 110.0, 10.0),
+            ("2025-09-01T17:03:00.123456", "gold", 120.0, 20.0),
+            ("2025-09-02T17:03:00.123456", "gold", 121.0, 0.83),
+        ])
+        self.assertEqual(get_next_price(conn, "gold", "2025-09-01"), (120.0, "2025-09-01T17:03:00.123456", 20.0))
+        self.assertIsNone(get_next_price(conn, "silver", "2025-09-01"))
+
+    def test_get_stored_days(self):
+        """Test grouping by calendar day within a half-open date range."""
+        conn = self.memory_connection()
+        insert_prices_bulk(conn, [
+            ("2024-12-31T00:00:00", "gold", 99.0, 0.0),
+            ("2025-01-01T00:00:00", "gold", 100.0, 0.0),
+            ("2025-01-01T17:03:00.123456", "gold", 102.0, 2.0),
+            ("2025-01-02T23:59:59.123456", "gold", 104.0, 2.0),
+            ("2025-01-03T00:00:00", "gold", 106.0, 1.9),
+        ])
+        stored = get_stored_days(conn, "2025-01-01T00:00:00", "2025-01-03")
+        self.assertEqual(stored, {
+            ("2025-01-01", "gold"): ("2025-01-01T00:00:00", 100.0, 0.0, 102.0),  # Closes at the last row
+            ("2025-01-02", "gold"): ("2025-01-02T23:59:59.123456", 104.0, 2.0, 104.0),
+        })
+
+    def test_build_backfill(self):
+        """Test changes for filled gaps and recalculation of the stored day after a gap."""
+        series = [
+            BackfillDay("2025-01-01T00:00:00", 100.0, 102.0, False, 0.0),  # Stored, closes at 102
+            BackfillDay("2025-01-02T00:00:00", 110.0, 110.0, True, None),   # Filled gap
+            BackfillDay("2025-01-03T00:00:00", 121.0, 121.0, False, 21.0),  # Stored, change was against day 1
+            BackfillDay("2025-01-04T00:00:00", 133.1, 133.1, False, 10.0),  # Stored, change already right
+        ]
+        rows, updates = build_backfill("gold", series, 100.0)
+        self.assertEqual(rows, [("2025-01-02T00:00:00", "gold", 110.0, 7.84)])
+        self.assertEqual(updates, [(10.0, "2025-01-03T00:00:00", "gold")])
+
+        series = [
+            BackfillDay("2025-08-30T00:00:00", 100.0, 100.0, False, 0.0),
+            BackfillDay("2025-08-31T00:00:00", 110.0, 110.0, True, None),     # Filled on the last day
+            BackfillDay("2025-09-01T17:03:00.123456", 120.0, 120.0, False, 20.0),  # First live row after
+        ]
+        rows, updates = build_backfill("gold", series, None)
+        self.assertEqual(updates, [(9.09, "2025-09-01T17:03:00.123456", "gold")])
+
+        rows, updates = build_backfill("gold", [BackfillDay("2025-01-01T00:00:00", 100.0, 100.0, True, None)], None)
+        self.assertEqual(rows, [("2025-01-01T00:00:00", "gold", 100.0, 0.0)])  # No previous price -> 0.0
+        self.assertEqual(build_backfill("gold", [], 100.0), ([], []))
+
+    def test_fetch_prices_for_plotting(self):
+        """Test that rows for both metals are split into ordered arrays."""
+        conn = self.memory_connection()
+        plan = conn.execute("""
+            EXPLAIN QUERY PLAN SELECT metal, date, price_usd, price_change FROM PreciousMetals
+            WHERE metal IN ('gold', 'silver') ORDER BY metal DESC, date
+        """).fetchall()
+        self.assertIn("idx_metal_date", plan[0][3])
+        self.assertFalse(any("TEMP B-TREE" in row[3] for row in plan))  # Served by the index, no sort
+
+        gold, silver = fetch_prices_for_plotting(conn)
+        self.assertEqual([a.size for a in gold + silver], [0] * 6)  # Empty table
+
+        conn.executemany("INSERT INTO PreciousMetals VALUES (?, ?, ?, ?)", [
+            ("2025-08-31T17:03:00.123456", "gold", 2100.0, 5.0),
+            ("2025-08-30T00:00:00", "gold", 2000.0, None),
+            ("2025-08-30T00:00:00", "silver", 30.0, -1.5),
+        ])
+        (gold_dates, gold_prices, gold_changes), (silver_dates, silver_prices, silver_changes) = \
+            fetch_prices_for_plotting(conn)
+
+        self.assertEqual(gold_dates.tolist(), np.array(["2025-08-30T00:00:00", "2025-08-31T17:03:00"],
+                                                       dtype="datetime64[s]").tolist())
+        self.assertEqual(gold_prices.tolist(), [2000.0, 2100.0])
+        self.assertTrue(np.isnan(gold_changes[0]))  # NULL change -> NaN
+        self.assertEqual(gold_changes[1], 5.0)
+        self.assertEqual(silver_dates.tolist(), np.array(["2025-08-30T00:00:00"], dtype="datetime64[s]").tolist())
+        self.assertEqual(silver_prices.tolist(), [30.0])
+        self.assertEqual(silver_changes.tolist(), [-1.5])
+
+    def test_insert_price_invalid_input(self):
+        """Test that an empty date is rejected and logged without touching the DB."""
+        mock_conn = MagicMock()
+        with patch('app.database.logger.error') as mock_error:
+            inserted = insert_price(mock_conn, "", "gold", 2100.0, 5.0)
+        self.assertFalse(inserted)
+        mock_error.assert_called_once()
+        self.assertIn("Invalid input", mock_error.call_args.args[0])
+        mock_conn.executemany.assert_not_called()
+
+        self.assertFalse(insert_price(mock_conn, 20250101, "gold", 2100.0, 5.0))  # Non-str date
+        mock_conn.executemany.assert_not_called()
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file